@@ -1,7 +1,9 @@
 import os
+import bson
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import DuplicateKeyError
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import logging
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
@@ -17,14 +19,38 @@ async def get_database():
 async def connect_to_mongo():
     """Create database connection"""
     try:
-        db.client = AsyncIOMotorClient(os.environ.get("MONGO_URL"))
-        db.database = db.client.formal_db
+        # Each uvicorn worker holds its own pool, sized to match --limit-concurrency.
+        # Keep a few connections warm and fail fast when the server is unreachable.
+        db.client = AsyncIOMotorClient(
+            os.environ.get("MONGO_URL"),
+            maxPoolSize=int(os.environ.get("MONGO_POOL_SIZE", "50")),
+            minPoolSize=int(os.environ.get("MONGO_MIN_POOL_SIZE", "2")),
+            maxIdleTimeMS=60000,
+            serverSelectionTimeoutMS=3000,
+            connectTimeoutMS=3000,
+            socketTimeoutMS=10000,
+            retryWrites=True,
+            # LaTeX content compresses well, the server picks the first codec it supports
+            compressors="zstd,snappy,zlib",
+            zlibCompressionLevel=6
+        )
+        db.database = db.client.get_database("formal_db")
+        
+        # BSON encoding/decoding is the main CPU cost on the request path,
+        # make sure it runs in PyMongo's C extension rather than pure Python.
+        # Rust-backed drivers such as mongojet don't change this, they still
+        # encode and decode documents through PyMongo's bson module.
+        if bson.has_c():
+            logger.info("Using the bson C extension")
+        else:
+            logger.warning("bson C extension is not available, falling back to pure Python BSON")
         
         # Test the connection
         await db.client.admin.command('ping')
         logger.info("Successfully connected to MongoDB")
         
-        # Create indexes
+        # Re-key records from before ids moved to _id, then create indexes
+        await migrate_ids()
         await create_indexes()
         
     except Exception as e:
@@ -37,22 +63,93 @@ async def close_mongo_connection():
         db.client.close()
         logger.info("Disconnected from MongoDB")
 
+async def drop_index_if_exists(collection, name: str):
+    """Drop an index, ignoring it if it was never created"""
+    try:
+        await collection.drop_index(name)
+        logger.info(f"Dropped index {collection.name}.{name}")
+    except OperationFailure:
+        pass
+
+# Completed one-off migrations are recorded in this collection by name
+ID_MIGRATION = "ids_to_underscore_id"
+
+async def migrate_ids():
+    """Move ids stored in a separate id field into _id, once per database"""
+    migrations = db.database.migrations
+    if await migrations.find_one({"_id": ID_MIGRATION}):
+        return
+    
+    # Claim the migration so concurrently starting workers don't all run it
+    try:
+        await migrations.insert_one({"_id": ID_MIGRATION, "done": False, "started_at": datetime.utcnow()})
+    except DuplicateKeyError:
+        return
+    
+    try:
+        for name in ("documents", "templates", "chat_messages"):
+            await migrate_collection_ids(db.database[name])
+    except Exception:
+        # Release the claim so the next startup retries
+        await migrations.delete_one({"_id": ID_MIGRATION})
+        raise
+    
+    await migrations.update_one(
+        {"_id": ID_MIGRATION},
+        {"$set": {"done": True, "finished_at": datetime.utcnow()}}
+    )
+
+async def migrate_collection_ids(collection):
+    """Re-key the records of one collection under _id = id"""
+    # Re-keyed records have no id field, the old unique index would reject all but one
+    await drop_index_if_exists(collection, "id_1")
+    
+    migrated = 0
+    async for record in collection.find({"id": {"$exists": True}}):
+        old_id = record.pop("_id")
+        record["_id"] = record.pop("id")
+        
+        if old_id == record["_id"]:
+            await collection.update_one({"_id": old_id}, {"$unset": {"id": ""}})
+            migrated += 1
+            continue
+        
+        # _id is immutable, so insert under the new key and remove the old record
+        try:
+            await collection.insert_one(record)
+        except DuplicateKeyError:
+            # Only an identical copy from an interrupted earlier run is safe to replace
+            if await collection.find_one({"_id": record["_id"]}) != record:
+                logger.warning(f"Kept {collection.name} record {old_id}: _id {record['_id']!r} already holds different data")
+                continue
+        
+        await collection.delete_one({"_id": old_id})
+        migrated += 1
+    
+    if migrated:
+        logger.info(f"Migrated {migrated} {collection.name} records to _id keys")
+
 async def create_indexes():
     """Create database indexes for better performance"""
     try:
+        # Single-field indexes superseded by the compound indexes below
+        await drop_index_if_exists(db.database.documents, "created_at_1")
+        await drop_index_if_exists(db.database.chat_messages, "document_id_1")
+        await drop_index_if_exists(db.database.chat_messages, "timestamp_1")
+        
+        # Ids are stored as _id, which Mongo already indexes uniquely
+        
         # Document indexes
-        await db.database.documents.create_index("id", unique=True)
-        await db.database.documents.create_index("created_at")
+        await db.database.documents.create_index([("created_at", -1), ("_id", 1)])  # paginated listing
         await db.database.documents.create_index("tags")
         
-        # Template indexes
-        await db.database.templates.create_index("id", unique=True)
-        await db.database.templates.create_index("category")
+        # Template indexes, listings are served from memory so category isn't queried
+        await drop_index_if_exists(db.database.templates, "category_1")
+        await drop_index_if_exists(db.database.templates, "category_1_name_1")
         await db.database.templates.create_index("is_builtin")
         
         # Chat indexes
-        await db.database.chat_messages.create_index("document_id")
-        await db.database.chat_messages.create_index("timestamp")
+        await db.database.chat_messages.create_index([("document_id", 1), ("timestamp", -1)])  # per-document history
         
         logger.info("Database indexes created successfully")
     except Exception as e:
@@ -1,10 +1,15 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 import uuid
 
+# Upper bound for LaTeX content, well under Mongo's 16 MB document limit
+MAX_CONTENT_LENGTH = 5_000_000
+
 class DocumentModel(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    model_config = ConfigDict(populate_by_name=True)
+    
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()), validation_alias="_id")  # stored as the Mongo _id
     title: str
     content: str  # LaTeX content
     template_id: Optional[str] = None
@@ -14,8 +19,18 @@ class DocumentModel(BaseModel):
     is_public: bool = False
     metadata: Dict[str, Any] = {}
 
+class DocumentSummary(BaseModel):  # listing view, without the LaTeX content
+    id: str
+    title: str
+    template_id: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    tags: List[str] = []
+
 class TemplateModel(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    model_config = ConfigDict(populate_by_name=True)
+    
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()), validation_alias="_id")  # stored as the Mongo _id
     name: str
     description: str
     content: str  # LaTeX template content
@@ -25,8 +40,20 @@ class TemplateModel(BaseModel):
     is_builtin: bool = True
     metadata: Dict[str, Any] = {}
 
+class TemplateSummary(BaseModel):  # listing view, without the LaTeX content
+    id: str
+    name: str
+    description: str
+    category: str
+    preview_image: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    is_builtin: bool = True
+    metadata: Dict[str, Any] = {}
+
 class ChatMessage(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    model_config = ConfigDict(populate_by_name=True)
+    
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()), validation_alias="_id")  # stored as the Mongo _id
     document_id: str
     message: str
     response: str
@@ -35,13 +62,13 @@ class ChatMessage(BaseModel):
 
 class DocumentCreate(BaseModel):
     title: str
-    content: str = ""
+    content: str = Field("", max_length=MAX_CONTENT_LENGTH)
     template_id: Optional[str] = None
     tags: List[str] = []
 
 class DocumentUpdate(BaseModel):
     title: Optional[str] = None
-    content: Optional[str] = None
+    content: Optional[str] = Field(None, max_length=MAX_CONTENT_LENGTH)
     tags: Optional[List[str]] = None
     metadata: Optional[Dict[str, Any]] = None
 
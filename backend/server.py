@@ -1,14 +1,19 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from contextlib import asynccontextmanager
 import os
+import asyncio
+import hashlib
+import uuid
+import orjson
 from dotenv import load_dotenv
 import logging
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
 
-from models import DocumentModel, TemplateModel, ChatMessage, DocumentCreate, DocumentUpdate, ChatRequest
+from models import DocumentModel, DocumentSummary, TemplateModel, TemplateSummary, ChatMessage, DocumentCreate, DocumentUpdate, ChatRequest, MAX_CONTENT_LENGTH
 from database import connect_to_mongo, close_mongo_connection, get_collection
 
 # Load environment variables
@@ -23,18 +28,44 @@ async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
     await initialize_templates()
+    await cache_stored_templates()
+    global chat_queue
+    chat_queue = asyncio.Queue(maxsize=CHAT_QUEUE_SIZE)  # bound to the serving event loop
+    chat_writer_task = asyncio.create_task(chat_writer())
     yield
     # Shutdown
+    await chat_queue.put(None)  # flush pending chat messages before disconnecting
+    await chat_writer_task
     await close_mongo_connection()
 
 app = FastAPI(
     title="Formal - LaTeX Editor API",
     description="Backend API for Formal LaTeX Editor with AI Integration",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-# Configure CORS
+class RequestSizeLimitMiddleware:
+    """Reject oversized requests before FastAPI reads and parses the body"""
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            content_length = dict(scope["headers"]).get(b"content-length", b"")
+            if content_length.isdigit() and int(content_length) > self.max_bytes:
+                response = ORJSONResponse({"detail": "Request body too large"}, status_code=413)
+                await response(scope, receive, send)
+                return
+        
+        await self.app(scope, receive, send)
+
+# Leaves headroom over MAX_CONTENT_LENGTH for the JSON encoding and other fields
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=MAX_CONTENT_LENGTH + 1_000_000)
+
+# Configure CORS (added last so it also wraps the size limit responses)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://127.0.0.1:3000"],
@@ -43,25 +74,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize built-in templates
-async def initialize_templates():
-    """Initialize the database with built-in LaTeX templates"""
-    templates_collection = await get_collection("templates")
-    
-    # Check if templates already exist
-    existing_count = await templates_collection.count_documents({"is_builtin": True})
-    if existing_count > 0:
-        logger.info(f"Found {existing_count} existing built-in templates")
-        return
-    
-    builtin_templates = [
-        {
-            "id": "template_article",
-            "name": "Academic Article",
-            "description": "Standard academic article format with abstract, sections, and bibliography",
-            "category": "academic",
-            "is_builtin": True,
-            "content": """\\documentclass[12pt]{article}
+# Built-in LaTeX templates
+BUILTIN_TEMPLATES = [
+    {
+        "id": "template_article",
+        "name": "Academic Article",
+        "description": "Standard academic article format with abstract, sections, and bibliography",
+        "category": "academic",
+        "is_builtin": True,
+        "content": """\\documentclass[12pt]{article}
 \\usepackage[utf8]{inputenc}
 \\usepackage{amsmath}
 \\usepackage{amsfonts}
@@ -97,14 +118,14 @@ Your conclusions go here.
 \\bibliography{references}
 
 \\end{document}"""
-        },
-        {
-            "id": "template_report",
-            "name": "Business Report",
-            "description": "Professional business report template with executive summary",
-            "category": "business",
-            "is_builtin": True,
-            "content": """\\documentclass[12pt]{report}
+    },
+    {
+        "id": "template_report",
+        "name": "Business Report",
+        "description": "Professional business report template with executive summary",
+        "category": "business",
+        "is_builtin": True,
+        "content": """\\documentclass[12pt]{report}
 \\usepackage[utf8]{inputenc}
 \\usepackage{geometry}
 \\usepackage{graphicx}
@@ -140,14 +161,14 @@ Provide actionable recommendations based on your analysis.
 Summarize the key points and next steps.
 
 \\end{document}"""
-        },
-        {
-            "id": "template_presentation",
-            "name": "Presentation Slides",
-            "description": "LaTeX Beamer presentation template",
-            "category": "presentation",
-            "is_builtin": True,
-            "content": """\\documentclass{beamer}
+    },
+    {
+        "id": "template_presentation",
+        "name": "Presentation Slides",
+        "description": "LaTeX Beamer presentation template",
+        "category": "presentation",
+        "is_builtin": True,
+        "content": """\\documentclass{beamer}
 \\usetheme{Madrid}
 \\usecolortheme{default}
 
@@ -192,14 +213,14 @@ Your main content goes here.
 \\end{frame}
 
 \\end{document}"""
-        },
-        {
-            "id": "template_math",
-            "name": "Mathematical Document",
-            "description": "Template for mathematical proofs and theorems",
-            "category": "academic",
-            "is_builtin": True,
-            "content": """\\documentclass[12pt]{article}
+    },
+    {
+        "id": "template_math",
+        "name": "Mathematical Document",
+        "description": "Template for mathematical proofs and theorems",
+        "category": "academic",
+        "is_builtin": True,
+        "content": """\\documentclass[12pt]{article}
 \\usepackage[utf8]{inputenc}
 \\usepackage{amsmath}
 \\usepackage{amsthm}
@@ -247,14 +268,14 @@ The proof follows from the Fundamental Theorem of Calculus...
 \\end{align}
 
 \\end{document}"""
-        },
-        {
-            "id": "template_letter",
-            "name": "Formal Letter",
-            "description": "Professional letter template",
-            "category": "business",
-            "is_builtin": True,
-            "content": """\\documentclass[12pt]{letter}
+    },
+    {
+        "id": "template_letter",
+        "name": "Formal Letter",
+        "description": "Professional letter template",
+        "category": "business",
+        "is_builtin": True,
+        "content": """\\documentclass[12pt]{letter}
 \\usepackage[utf8]{inputenc}
 \\usepackage{geometry}
 \\geometry{margin=1in}
@@ -277,19 +298,151 @@ Second paragraph continues your message with additional details or information y
 \\end{letter}
 
 \\end{document}"""
-        }
-    ]
+    }
+]
+
+# Fields returned by document listings, matching DocumentSummary
+SUMMARY_PROJECTION = {"title": 1, "template_id": 1, "created_at": 1, "updated_at": 1, "tags": 1}
+
+def by_id(doc_id: str) -> dict:
+    """Filter matching a single stored document by its id"""
+    return {"_id": doc_id}
+
+def from_mongo(doc: dict) -> dict:
+    """Expose a stored document's _id as the API's id field"""
+    return {"id": doc.pop("_id"), **doc}
+
+async def stream_json_array(first: bytes, cursor):
+    """Encode cursor results as a JSON array after its already encoded first element"""
+    yield b"[" + first
+    try:
+        async for doc in cursor:
+            yield b"," + orjson.dumps(from_mongo(doc))
+    except Exception as e:
+        # Headers are already sent, abort the response instead of closing the array
+        logger.error(f"Error streaming documents: {e}")
+        raise
     
-    # Insert templates
-    for template in builtin_templates:
-        try:
-            await templates_collection.insert_one(template)
-            logger.info(f"Inserted template: {template['name']}")
-        except Exception as e:
-            logger.error(f"Failed to insert template {template['name']}: {e}")
+    yield b"]"
+
+# ETags for conditional GETs
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weakly compare an ETag against the request's If-None-Match list or *"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    
+    opaque = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+def document_etag(document: dict) -> str:
+    """Weak ETag that changes whenever the document is updated"""
+    return f'W/"{document["updated_at"].timestamp()}"'
+
+def template_etag(template: dict) -> str:
+    """Weak ETag derived from the template content"""
+    return f'W/"{hashlib.sha1(template["content"].encode()).hexdigest()}"'
+
+# Built-in templates never change at runtime, so they are validated and
+# serialized once at import and served as ready-made JSON
+_builtin_templates = [TemplateModel(**t).model_dump() for t in sorted(BUILTIN_TEMPLATES, key=lambda t: t["name"])]
+_builtin_summaries = [TemplateSummary(**t).model_dump() for t in _builtin_templates]
+
+TEMPLATE_BLOBS: Dict[str, bytes] = {t["id"]: orjson.dumps(t) for t in _builtin_templates}
+TEMPLATE_ETAGS: Dict[str, str] = {t["id"]: template_etag(t) for t in _builtin_templates}
+
+def encode_template_listings(summaries: List[dict]):
+    """Encode the template listing as a whole and per category, sorted by name"""
+    summaries = sorted(summaries, key=lambda t: t["name"])
+    by_category: Dict[str, List[dict]] = {}
+    for template in summaries:
+        by_category.setdefault(template["category"], []).append(template)
+    
+    return orjson.dumps(summaries), {category: orjson.dumps(ts) for category, ts in by_category.items()}
+
+TEMPLATE_LIST_BLOB, TEMPLATE_CATEGORY_BLOBS = encode_template_listings(_builtin_summaries)
+
+async def cache_stored_templates():
+    """Merge templates stored in the database into the cached listings"""
+    global TEMPLATE_LIST_BLOB, TEMPLATE_CATEGORY_BLOBS
+    
+    templates_collection = await get_collection("templates")
+    cursor = templates_collection.find({"is_builtin": False}, projection={"content": 0})
+    stored = [TemplateSummary(**from_mongo(t)).model_dump() for t in await cursor.to_list(length=None)]
+    
+    if stored:
+        TEMPLATE_LIST_BLOB, TEMPLATE_CATEGORY_BLOBS = encode_template_listings(_builtin_summaries + stored)
+        logger.info(f"Cached {len(stored)} stored templates")
+
+# Initialize built-in templates
+async def initialize_templates():
+    """Initialize the database with built-in LaTeX templates"""
+    templates_collection = await get_collection("templates")
+    
+    # Check if templates already exist, one matching document is enough
+    existing = await templates_collection.find_one({"is_builtin": True}, projection={"_id": 1})
+    if existing:
+        logger.info("Found existing built-in templates")
+        return
+    
+    # Insert templates in a single round trip, upserting by id so a concurrent
+    # startup can't create duplicates
+    try:
+        result = await templates_collection.bulk_write(
+            [
+                UpdateOne(by_id(t["id"]), {"$setOnInsert": {k: v for k, v in t.items() if k != "id"}}, upsert=True)
+                for t in BUILTIN_TEMPLATES
+            ],
+            ordered=False
+        )
+        logger.info(f"Inserted {result.upserted_count} built-in templates")
+    except Exception as e:
+        logger.error(f"Failed to insert built-in templates: {e}")
     
     logger.info("Built-in templates initialization completed")
 
+# Chat messages are persisted off the request path, in batches
+CHAT_BATCH_SIZE = 200
+CHAT_FLUSH_INTERVAL = 0.1  # seconds
+CHAT_QUEUE_SIZE = 10000
+chat_queue: Optional[asyncio.Queue] = None  # created in lifespan
+
+async def write_chat_batch(batch: List[dict]):
+    """Insert a batch of chat messages"""
+    try:
+        chat_collection = await get_collection("chat_messages")
+        await chat_collection.insert_many(batch, ordered=False)
+    except Exception as e:
+        logger.error(f"Failed to store {len(batch)} chat messages: {e}")
+
+async def chat_writer():
+    """Drain the chat queue until a None sentinel is received"""
+    loop = asyncio.get_running_loop()
+    while True:
+        message = await chat_queue.get()
+        if message is None:
+            return
+        
+        # Collect whatever else arrives within the flush interval
+        batch = [message]
+        deadline = loop.time() + CHAT_FLUSH_INTERVAL
+        while len(batch) < CHAT_BATCH_SIZE:
+            try:
+                message = await asyncio.wait_for(chat_queue.get(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            
+            if message is None:
+                await write_chat_batch(batch)
+                return
+            batch.append(message)
+        
+        await write_chat_batch(batch)
+
 # API Routes
 @app.get("/api/health")
 async def health_check():
@@ -302,39 +455,63 @@ async def create_document(document: DocumentCreate):
     try:
         documents_collection = await get_collection("documents")
         
-        new_document = DocumentModel(**document.dict())
-        await documents_collection.insert_one(new_document.dict())
+        # Build the stored document directly, only the server-side fields
+        # differ from the validated request body
+        now = datetime.utcnow()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)  # Mongo stores milliseconds
+        new_document = {"_id": str(uuid.uuid4()), **document.model_dump()}
+        new_document["created_at"] = new_document["updated_at"] = now
+        new_document["is_public"] = False
+        new_document["metadata"] = {}
         
-        return new_document
+        await documents_collection.insert_one(new_document)
+        
+        return ORJSONResponse(from_mongo(new_document))
     except Exception as e:
         logger.error(f"Error creating document: {e}")
         raise HTTPException(status_code=500, detail="Failed to create document")
 
-@app.get("/api/documents", response_model=List[DocumentModel])
+@app.get("/api/documents", response_model=List[DocumentSummary])
 async def get_documents(skip: int = 0, limit: int = 20):
     """Get all documents with pagination"""
     try:
         documents_collection = await get_collection("documents")
         
-        cursor = documents_collection.find().skip(skip).limit(limit).sort("created_at", -1)
-        documents = await cursor.to_list(length=limit)
+        # Listings don't need the LaTeX content, fetch it through get_document
+        cursor = documents_collection.find({}, projection=SUMMARY_PROJECTION).sort("created_at", -1).skip(skip).limit(limit)
+        cursor = cursor.batch_size(50)
+        
+        # Run the query and encode the first document before streaming, so
+        # errors there still produce a 500 instead of a truncated 200
+        try:
+            first = await cursor.next()
+        except StopAsyncIteration:
+            return Response(b"[]", media_type="application/json")
+        first_chunk = orjson.dumps(from_mongo(first))
         
-        return [DocumentModel(**doc) for doc in documents]
+        return StreamingResponse(stream_json_array(first_chunk, cursor), media_type="application/json")
     except Exception as e:
         logger.error(f"Error fetching documents: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch documents")
 
 @app.get("/api/documents/{document_id}", response_model=DocumentModel)
-async def get_document(document_id: str):
+async def get_document(document_id: str, request: Request):
     """Get a specific document by ID"""
     try:
         documents_collection = await get_collection("documents")
         
-        document = await documents_collection.find_one({"id": document_id})
+        # Revalidate against updated_at alone before fetching the whole document
+        if "if-none-match" in request.headers:
+            stamp = await documents_collection.find_one(by_id(document_id), projection={"updated_at": 1})
+            if stamp and etag_matches(request, document_etag(stamp)):
+                return Response(status_code=304, headers={"ETag": document_etag(stamp)})
+        
+        document = await documents_collection.find_one(by_id(document_id))
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        return DocumentModel(**document)
+        # Stored documents are trusted, skip response model validation
+        return ORJSONResponse(from_mongo(document), headers={"ETag": document_etag(document)})
     except HTTPException:
         raise
     except Exception as e:
@@ -348,20 +525,20 @@ async def update_document(document_id: str, update_data: DocumentUpdate):
         documents_collection = await get_collection("documents")
         
         # Prepare update data
-        update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
+        update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
         update_dict["updated_at"] = datetime.utcnow()
         
-        result = await documents_collection.update_one(
-            {"id": document_id},
-            {"$set": update_dict}
+        # Update and read back the document in a single round trip
+        updated_document = await documents_collection.find_one_and_update(
+            by_id(document_id),
+            {"$set": update_dict},
+            return_document=ReturnDocument.AFTER
         )
         
-        if result.matched_count == 0:
+        if updated_document is None:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        # Return updated document
-        updated_document = await documents_collection.find_one({"id": document_id})
-        return DocumentModel(**updated_document)
+        return ORJSONResponse(from_mongo(updated_document))
     except HTTPException:
         raise
     except Exception as e:
@@ -374,7 +551,7 @@ async def delete_document(document_id: str):
     try:
         documents_collection = await get_collection("documents")
         
-        result = await documents_collection.delete_one({"id": document_id})
+        result = await documents_collection.delete_one(by_id(document_id))
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Document not found")
         
@@ -386,35 +563,38 @@ async def delete_document(document_id: str):
         raise HTTPException(status_code=500, detail="Failed to delete document")
 
 # Template endpoints
-@app.get("/api/templates", response_model=List[TemplateModel])
+@app.get("/api/templates", response_model=List[TemplateSummary])
 async def get_templates(category: Optional[str] = None):
     """Get all templates, optionally filtered by category"""
-    try:
-        templates_collection = await get_collection("templates")
-        
-        query = {}
-        if category:
-            query["category"] = category
-        
-        cursor = templates_collection.find(query).sort("name", 1)
-        templates = await cursor.to_list(length=None)
-        
-        return [TemplateModel(**template) for template in templates]
-    except Exception as e:
-        logger.error(f"Error fetching templates: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch templates")
+    # Listings are cached at startup, the API doesn't create templates at runtime
+    if category:
+        return Response(TEMPLATE_CATEGORY_BLOBS.get(category, b"[]"), media_type="application/json")
+    
+    return Response(TEMPLATE_LIST_BLOB, media_type="application/json")
 
 @app.get("/api/templates/{template_id}", response_model=TemplateModel)
-async def get_template(template_id: str):
+async def get_template(template_id: str, request: Request):
     """Get a specific template by ID"""
+    blob = TEMPLATE_BLOBS.get(template_id)
+    if blob is not None:
+        etag = TEMPLATE_ETAGS[template_id]
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        return Response(blob, media_type="application/json", headers={"ETag": etag})
+    
     try:
         templates_collection = await get_collection("templates")
         
-        template = await templates_collection.find_one({"id": template_id})
+        template = await templates_collection.find_one(by_id(template_id))
         if not template:
             raise HTTPException(status_code=404, detail="Template not found")
         
-        return TemplateModel(**template)
+        etag = template_etag(template)
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        return ORJSONResponse(from_mongo(template), headers={"ETag": etag})
     except HTTPException:
         raise
     except Exception as e:
@@ -438,7 +618,6 @@ async def chat_with_ai(chat_request: ChatRequest):
         }
         
         # Store chat message for future reference
-        chat_collection = await get_collection("chat_messages")
         chat_message = ChatMessage(
             document_id=chat_request.document_id,
             message=chat_request.message,
@@ -446,25 +625,29 @@ async def chat_with_ai(chat_request: ChatRequest):
             context=chat_request.context or {}
         )
         
-        await chat_collection.insert_one(chat_message.dict())
+        stored_message = {"_id": chat_message.id, **chat_message.model_dump(exclude={"id"})}
+        try:
+            chat_queue.put_nowait(stored_message)
+        except asyncio.QueueFull:
+            chat_collection = await get_collection("chat_messages")
+            await chat_collection.insert_one(stored_message)
         
         return response
     except Exception as e:
         logger.error(f"Error in chat: {e}")
         raise HTTPException(status_code=500, detail="Chat service temporarily unavailable")
 
+# Template categories are static, encode them once
+CATEGORIES_BLOB = orjson.dumps({
+    "categories": [
+        {"id": "academic", "name": "Academic", "description": "Academic papers, theses, and research documents"},
+        {"id": "business", "name": "Business", "description": "Reports, letters, and business documents"},
+        {"id": "presentation", "name": "Presentation", "description": "Slides and presentation materials"},
+        {"id": "personal", "name": "Personal", "description": "Personal documents and notes"}
+    ]
+})
+
 @app.get("/api/categories")
 async def get_template_categories():
     """Get all available template categories"""
-    return {
-        "categories": [
-            {"id": "academic", "name": "Academic", "description": "Academic papers, theses, and research documents"},
-            {"id": "business", "name": "Business", "description": "Reports, letters, and business documents"},
-            {"id": "presentation", "name": "Presentation", "description": "Slides and presentation materials"},
-            {"id": "personal", "name": "Personal", "description": "Personal documents and notes"}
-        ]
-    }
-
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    return Response(CATEGORIES_BLOB, media_type="application/json")
\ No newline at end of file
@@ -3,7 +3,7 @@ import Layout from './components/Layout';
 import Editor from './components/Editor';
 import Sidebar from './components/Sidebar';
 import ChatPanel from './components/ChatPanel';
-import { Document, Template } from './types';
+import { Document, DocumentSummary, TemplateSummary } from './types';
 import { documentApi, templateApi, healthApi } from './utils/api';
 
 function App() {
@@ -66,11 +66,16 @@ function App() {
     }
   };
 
-  const handleDocumentSelect = async (doc: Document) => {
+  const handleDocumentSelect = async (summary: DocumentSummary) => {
     if (hasUnsavedChanges && currentDocument) {
       await saveCurrentDocument();
     }
-    
+
+    // Listings don't include the LaTeX content, load the full document
+    const response = await documentApi.getById(summary.id);
+    if (!response.data) return;
+
+    const doc = response.data;
     setCurrentDocument(doc);
     setDocumentContent(doc.content);
     setHasUnsavedChanges(false);
@@ -126,11 +131,16 @@ Conclude your document here.
     }
   };
 
-  const handleTemplateSelect = async (template: Template) => {
+  const handleTemplateSelect = async (summary: TemplateSummary) => {
     if (hasUnsavedChanges && currentDocument) {
       await saveCurrentDocument();
     }
 
+    const templateResponse = await templateApi.getById(summary.id);
+    if (!templateResponse.data) return;
+
+    const template = templateResponse.data;
+
     const newDoc: Omit<Document, 'id' | 'created_at' | 'updated_at'> = {
       title: `${template.name} - ${new Date().toLocaleDateString()}`,
       content: template.content,
@@ -1,14 +1,14 @@
 import React, { useState, useEffect } from 'react';
 import { Plus, Search, FileText, Tag, Calendar, MessageCircle } from 'lucide-react';
-import { Document, Template } from '../types';
+import { DocumentSummary, TemplateSummary } from '../types';
 import { documentApi, templateApi } from '../utils/api';
 
 interface SidebarProps {
   isOpen: boolean;
   onClose: () => void;
-  onDocumentSelect: (doc: Document) => void;
+  onDocumentSelect: (doc: DocumentSummary) => void;
   onNewDocument: () => void;
-  onTemplateSelect: (template: Template) => void;
+  onTemplateSelect: (template: TemplateSummary) => void;
   darkMode: boolean;
   currentDocumentId?: string;
 }
@@ -23,8 +23,8 @@ const Sidebar: React.FC<SidebarProps> = ({
   currentDocumentId
 }) => {
   const [activeTab, setActiveTab] = useState<'documents' | 'templates'>('documents');
-  const [documents, setDocuments] = useState<Document[]>([]);
-  const [templates, setTemplates] = useState<Template[]>([]);
+  const [documents, setDocuments] = useState<DocumentSummary[]>([]);
+  const [templates, setTemplates] = useState<TemplateSummary[]>([]);
   const [searchQuery, setSearchQuery] = useState('');
   const [loading, setLoading] = useState(false);
 
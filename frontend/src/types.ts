@@ -10,6 +10,8 @@ export interface Document {
   metadata: Record<string, any>;
 }
 
+export type DocumentSummary = Pick<Document, 'id' | 'title' | 'template_id' | 'created_at' | 'updated_at' | 'tags'>;
+
 export interface Template {
   id: string;
   name: string;
@@ -22,6 +24,8 @@ export interface Template {
   metadata: Record<string, any>;
 }
 
+export type TemplateSummary = Omit<Template, 'content'>;
+
 export interface ChatMessage {
   id: string;
   document_id: string;
@@ -1,4 +1,4 @@
-import { Document, Template, Category, ChatMessage, ApiResponse } from '../types';
+import { Document, DocumentSummary, Template, TemplateSummary, Category, ChatMessage, ApiResponse } from '../types';
 
 const API_BASE = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
 
@@ -29,7 +29,7 @@ async function apiRequest<T>(
 
 // Document API
 export const documentApi = {
-  getAll: (skip = 0, limit = 20): Promise<ApiResponse<Document[]>> =>
+  getAll: (skip = 0, limit = 20): Promise<ApiResponse<DocumentSummary[]>> =>
     apiRequest(`/api/documents?skip=${skip}&limit=${limit}`),
 
   getById: (id: string): Promise<ApiResponse<Document>> =>
@@ -55,7 +55,7 @@ export const documentApi = {
 
 // Template API
 export const templateApi = {
-  getAll: (category?: string): Promise<ApiResponse<Template[]>> => {
+  getAll: (category?: string): Promise<ApiResponse<TemplateSummary[]>> => {
     const url = category ? `/api/templates?category=${category}` : '/api/templates';
     return apiRequest(url);
   },